@@ -19,7 +19,6 @@
 # pylint: disable=too-many-statements
 # pylint: disable=too-many-locals
 # pylint: disable=too-many-lines
-# pylint: disable=global-statement
 #===============================================================================
 # Add-on: HAOS Kiosk Display (haoskiosk)
 # File: ultrasonic-trigger.py
@@ -35,9 +34,11 @@
 #   - Also turn on/off audio if ULTRASONIC_AUDIO is True
 #
 # When measuring distance:
-#   - Take GPIO_READINGS_TO_AVERAGE and average the valid ones
+#   - Take GPIO_READINGS_TO_AVERAGE readings and return the median of the valid ones
+#     (median rejects outlier readings, e.g. from reflections)
 #   - Mark as invalid measurement if more than half of the readings are errors
-#   - Restart if more than INVALID_COUNT_THRESHOLD invalid measurements in a row
+#   - Reinitialize GPIO if more than INVALID_COUNT_THRESHOLD invalid measurements in a row
+#     (restart if reinitialization fails)
 #
 # Optionally, if HA_BINARY SENSOR is set, then:
 #   - If HA_DISPLAY_TOGGLE is True/False, then keep display always on when HA_BINARY_SENSOR is on/off;
@@ -55,19 +56,31 @@
 #   - Requires adding the following Python libraries: pyftdi, requests
 #     Probably best to install in venv so it persists reboots
 #   - Should run as root (e.g., 'sudo')
+#   - The FT232H is run in MPSSE mode so that the echo edges are detected
+#     by the chip itself (WAIT_ON_HIGH/WAIT_ON_LOW) rather than by polling
+#     the GPIO over USB. MPSSE can only wait on GPIOL1, so ECHO is fixed at
+#     AD5; TRIG defaults to AD4 (AD6 or AD7 also work)
+#   - The echo pulse width is taken from the host arrival times of the two
+#     edge reports over USB, which adds up to ~1ms of jitter (~17cm)
+#   - UPGRADING: earlier versions used AD0/AD1, so rewire TRIG->AD4, ECHO->AD5
 #
 #===============================================================================
 ### Imports
 
 import logging
 import os
+import queue
 import signal
 import sys
+import threading
 import time
 import types
-from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from datetime import timedelta
+from statistics import median
+from typing import Any, Callable
 import requests
-from pyftdi.gpio import GpioController  # type: ignore[import-untyped]
+from pyftdi.ftdi import Ftdi  # type: ignore[import-untyped]
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
@@ -75,11 +88,15 @@ from urllib3.util.retry import Retry
 ### Configuration Variables
 
 # Configure ultrasonic sensor readings
-TRIG_PIN: int = 0                  # AD0 - Output
-ECHO_PIN: int = 1                  # AD1 - Input
-GPIO_READINGS_TO_AVERAGE: int = 5  # Number of distance readings to average
+FTDI_URL: str = 'ftdi://ftdi:232h/1'
+TRIG_PIN: int = 4                  # AD4 (GPIOL0) - Output (must be 4, 6, or 7)
+                                   # Note: ECHO is fixed at AD5 (GPIOL1) since MPSSE WAIT_ON_HIGH/LOW only monitor GPIOL1
+MPSSE_FREQUENCY: float = 1.0E6     # MPSSE clock used to time the trigger pulse (1 MHz = 1 µs per clock)
+GPIO_READINGS_TO_AVERAGE: int = 3  # Number of distance readings per measurement (median is used)
 WAIT_TIMEOUT:float = 0.05          # Timeout for wait_for_pin (seconds) (this is conservative)
                                    # Note HC-SR04 pulls pin low after 38ms (which with speed of sound 343m/s is equivalent to ~6.5m each way)
+RETRIGGER_DELAY: float = 0.06      # Delay before re-triggering after an echo timeout (seconds) (HC-SR04 60ms measurement cycle)
+                                   # No delay is needed after a completed echo
 # HA general variables
 HA_PORT = 8123
 HA_BEARER_TOKEN: str| None = None  # Needed if using HA_BINARY_SENSOR
@@ -107,16 +124,35 @@ FAR_OFF_DIST: int = 200            # Far distance threshold (in cm) before turni
 COUNT_ON_THRESH: int = 2           # Number of 'near' distance measurements before turning on
 COUNT_OFF_THRESH: int = 4          # Number of 'far' distance measurements before turning off
 
-INVALID_COUNT_THRESHOLD: int = 10   # Number of consecutive invalid measurements before restarting
+INVALID_COUNT_THRESHOLD: int = 10   # Number of consecutive invalid measurements before reinitializing GPIO
 
-HTTP_TIMEOUT: int = 3              # Timeout for HTTP get and posts (in seconds)
+HTTP_TIMEOUT: int = 1              # Timeout for HTTP gets and connects (in seconds) (all calls are to localhost)
+HTTP_POST_TIMEOUT: int = 10        # Read timeout for HTTP posts (in seconds) (e.g., disable_inputs, launch_url, unmute_audio can take > 1s)
 
 #===============================================================================
 ### Setup
 
-current_url: str | None = None
+@dataclass(slots=True)
+class State:
+    """Mutable program state (kept in one slotted instance rather than as module globals)"""
+    # Ultrasonic sensor
+    mpsse_frequency: float = MPSSE_FREQUENCY  # Actual MPSSE clock frequency (set when opening the FTDI)
+    trigger_cmd: bytes = b""                  # MPSSE command buffer for trigger pulse + echo capture (built when opening the FTDI)
+    invalid_count: int = 0                    # Number of consecutive invalid measurements
+    # Main loop timer
+    loop_tfd: int | None = None               # Periodic timerfd pacing the main loop (None if timerfd not available)
+    loop_deadline_ns: int = 0                 # Next loop deadline (monotonic ns) if no timerfd
+    # Kiosk state (None = unknown)
+    display: bool | None = None
+    last_display_time: float = field(default_factory=time.monotonic)
+    inputs_disabled: bool | None = None
+    mute: bool | None = None
+    url: str | None = None
+
+S = State()
+
 if ROTATE_URL_LIST:  # Non-empty list
-    current_url = ROTATE_URL_LIST[0]
+    S.url = ROTATE_URL_LIST[0]
 else:  # Empty rotate list so turn off rotation
     HA_ROTATE_TOGGLE = False
 
@@ -124,10 +160,9 @@ if HA_BINARY_SENSOR_FRIENDLY_NAME is None and HA_BINARY_SENSOR is not None:
     #Get string after last '.', replace '_' with space, capitalize words
     HA_BINARY_SENSOR_FRIENDLY_NAME = HA_BINARY_SENSOR.rsplit('.', 1)[-1].replace('_', ' ').title()
 
-#Relaunch 'unbuffered' if not already unbuffered so that you can pipe output real-time if desired
-if os.environ.get('PYTHONUNBUFFERED') != '1':
-    os.environ['PYTHONUNBUFFERED'] = '1'
-    os.execvp(sys.executable, [sys.executable] + sys.argv)
+#Line buffer output so that you can pipe output real-time if desired (without relaunching unbuffered)
+sys.stdout.reconfigure(line_buffering=True)  # type: ignore[union-attr]
+sys.stderr.reconfigure(line_buffering=True)  # type: ignore[union-attr]
 
 # Suppress urllib3 retry warnings
 logging.getLogger("urllib3").setLevel(logging.ERROR)
@@ -143,8 +178,12 @@ logger = logging.getLogger(__name__)
 
 ### Ultrasonic distance sensing
 TRIG_MASK = 1 << TRIG_PIN
-ECHO_MASK = 1 << ECHO_PIN
-gpio = GpioController()
+LOOP_TIME_NS = LOOP_TIME * 1_000_000_000
+# FTDI latency timer (ms): how often the FTDI sends an (empty) USB packet when it has no data
+# Echo edges are sent immediately (SEND_IMMEDIATE), so set it to WAIT_TIMEOUT so that 'wait_for_pin'
+# sleeps in the kernel (libusb read) for the whole wait rather than waking every few ms
+FTDI_LATENCY = min(255, max(1, round(WAIT_TIMEOUT * 1000)))
+ftdi = Ftdi()
 
 #===============================================================================
 ### Subroutines
@@ -161,54 +200,111 @@ def cleanup() -> None:
     """Cleanup before exiting..."""
     date_time = get_datetime()
     print()
+    stop_http_workers()  # So that no pending REST call overwrites the state restored below
     try:
         if display_state() is False:
             display_on_print()  # Turn display and audio back on...
 
-        if current_mute is True:
+        if S.mute is True:
             ha_mute_audio(False)  # Unmute audio
             print(f"[{date_time}] Unmuting audio...")
 
-        if current_inputs_disabled is True:
+        if S.inputs_disabled is True:
             ha_disable_inputs(False) # Restore inputs
             print(f"[{date_time}] Enabling inputs...")
 
-        if current_url is not None and current_url != ROTATE_URL_LIST[0]:
+        if S.url is not None and S.url != ROTATE_URL_LIST[0]:
             ha_launch_url(ROTATE_URL_LIST[0]) # Restore default (first) url
             print(f"[{date_time}] Restoring URL: {ROTATE_URL_LIST[0]}")
 
-        gpio.close()
+        ftdi.close()
     except Exception as e:
         logger.error("Error: GPIO close failed (%s)", e)
+    if S.loop_tfd is not None:
+        os.close(S.loop_tfd)
+        S.loop_tfd = None
     print(f"[{date_time}] Exiting...")
 
+def mpsse_delay(delay_us: float) -> bytes:
+    """Return MPSSE commands that idle for 'delay_us' by clocking with no data (TCK/AD0 is unused)"""
+    clocks = max(1, round(delay_us * S.mpsse_frequency / 1e6))
+    cmd = b""
+    if clocks >= 8:
+        length = clocks // 8 - 1
+        cmd += bytes((Ftdi.CLK_BYTES_NO_DATA, length & 0xFF, length >> 8))
+        clocks %= 8
+    if clocks:
+        cmd += bytes((Ftdi.CLK_BITS_NO_DATA, clocks - 1))
+    return cmd
+
+def open_ftdi() -> None:
+    """Open FT232H in MPSSE mode with TRIG as output (low) and ECHO as input
+
+    Also build the trigger command buffer since its delays depend on the actual MPSSE clock:
+    the trigger pulse is followed by WAIT_ON_HIGH/WAIT_ON_LOW so the FT232H waits on ECHO
+    itself and returns one GPIO byte (see 'wait_for_pin') when ECHO goes high and another
+    when ECHO goes low. The pulse width is the difference of their host arrival times, so
+    USB scheduling adds up to ~1ms (~17cm) of jitter.
+    """
+    S.mpsse_frequency = ftdi.open_mpsse_from_url(FTDI_URL, direction=TRIG_MASK, initial=0, frequency=MPSSE_FREQUENCY, latency=FTDI_LATENCY)
+    set_low = Ftdi.SET_BITS_LOW
+    S.trigger_cmd = (
+        bytes((set_low, 0, TRIG_MASK)) + mpsse_delay(2)             # 2 µs low
+        + bytes((set_low, TRIG_MASK, TRIG_MASK)) + mpsse_delay(10)  # 10 µs pulse
+        + bytes((set_low, 0, TRIG_MASK,
+                 Ftdi.WAIT_ON_HIGH, Ftdi.GET_BITS_LOW, Ftdi.SEND_IMMEDIATE,  # Report ECHO rising edge
+                 Ftdi.WAIT_ON_LOW, Ftdi.GET_BITS_LOW, Ftdi.SEND_IMMEDIATE))  # Report ECHO falling edge
+    )
+
+def reset_mpsse() -> None:
+    """Abort an MPSSE wait that never completed (e.g., no echo) and discard any late echo bytes
+
+    Purging the buffers alone does not abort a pending WAIT_ON_HIGH/WAIT_ON_LOW, so reset the
+    bit mode and re-enter MPSSE (same sequence as 'open_mpsse_from_url' but without reopening USB).
+    Reopen the FTDI only if that fails.
+    """
+    try:
+        ftdi.set_bitmode(0, Ftdi.BitMode.RESET)
+        ftdi.purge_buffers()
+        ftdi.set_bitmode(TRIG_MASK, Ftdi.BitMode.MPSSE)
+        ftdi._set_frequency(S.mpsse_frequency)  # pylint: disable=protected-access
+        ftdi.write_data(bytes((Ftdi.SET_BITS_LOW, 0, TRIG_MASK, Ftdi.LOOPBACK_END)))
+        return
+    except Exception as e:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("MPSSE reset FAILED, reopening FTDI (%s)", e)
+    try:
+        ftdi.close()
+        open_ftdi()
+    except Exception as e:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("FTDI reset FAILED (%s)", e)
+
 def send_trigger_pulse()-> bool:
-    """Send ultrasonic trigger pulse"""
+    """Send ultrasonic trigger pulse and queue MPSSE capture of the echo edges in a single USB write"""
     try:
-        gpio.write(0)
-        time.sleep(0.000002)  # 2 µs
-        gpio.write(TRIG_MASK)  # Set TRIG high
-        time.sleep(0.00001)    # 10 us pulse
-        gpio.write(0)
+        ftdi.write_data(S.trigger_cmd)
         return True
     except Exception as e:
-        logger.debug("GPIO write FAILED (%s)", e)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("GPIO write FAILED (%s)", e)
         return False
 
-def wait_for_pin(echo_mask: int, echo_level: bool, timeout: float=WAIT_TIMEOUT) -> int | None:
-    """Wait for pin"""
-    timeout_ns = int(timeout * 1e9)
-    start_ns = time.monotonic_ns()
+def wait_for_pin(timeout: float=WAIT_TIMEOUT) -> int | None:
+    """Wait for the next echo edge reported by MPSSE and return its arrival time (ns)"""
+    read = ftdi.read_data_bytes  # Bind to locals to avoid global/attribute lookups in the loop
+    monotonic_ns = time.monotonic_ns
+    deadline_ns = monotonic_ns() + int(timeout * 1e9)
     try:
-        while (time_ns := time.monotonic_ns()) - start_ns < timeout_ns:
-            if bool(gpio.read() & echo_mask) == echo_level:
-                return time_ns
+        while monotonic_ns() < deadline_ns:
+            if read(1):  # Blocks in libusb until echo edge arrives or FTDI latency timer expires
+                return monotonic_ns()
         return None
     except Exception as e:
-        logger.debug("GPIO read FAILED (%s)", e)
+        if logger.isEnabledFor(logging.DEBUG):  # Skip formatting 'e' in error storms (e.g., bad USB cable)
+            logger.debug("GPIO read FAILED (%s)", e)
         return None
 
-invalid_count = 0  # Number of consecutive invalid measurements
 def measure_distance() -> float | None:
     """Measure distance"""
     distances = []
@@ -218,15 +314,19 @@ def measure_distance() -> float | None:
             errors += 1
             continue
 
-        start_time = wait_for_pin(ECHO_MASK, True)
+        start_time = wait_for_pin()
         if start_time is None:
             logger.debug("Timeout waiting for ECHO to go HIGH")
+            time.sleep(RETRIGGER_DELAY)  # Let echo cycle complete first so reset also discards its late edge bytes
+            reset_mpsse()  # Abort pending MPSSE wait
             errors += 1
             continue
 
-        end_time = wait_for_pin(ECHO_MASK, False)
+        end_time = wait_for_pin()
         if end_time is None:
             logger.debug("Timeout waiting for ECHO to go LOW")
+            time.sleep(RETRIGGER_DELAY)  # Let echo cycle complete first so reset also discards its late edge bytes
+            reset_mpsse()  # Abort pending MPSSE wait
             errors += 1
             continue
 
@@ -236,152 +336,183 @@ def measure_distance() -> float | None:
             distances.append(distance_cm)
         else:
             errors += 1
-        time.sleep(0.01)  # Small delay between readings to avoid sensor overload
 
-    global invalid_count
     if errors >= (GPIO_READINGS_TO_AVERAGE / 2):
-        invalid_count +=1
-        if invalid_count > INVALID_COUNT_THRESHOLD:
-            logger.error("Too many invalid measurements (%d), restarting...", INVALID_COUNT_THRESHOLD)
+        S.invalid_count +=1
+        if S.invalid_count > INVALID_COUNT_THRESHOLD:
+            logger.error("Too many invalid measurements (%d), reinitializing GPIO...", INVALID_COUNT_THRESHOLD)
+            # Reopen FTDI in place (keeps HTTP session and its connections alive)
             try:
-                gpio.close()
+                ftdi.close()
             except Exception:
                 pass
-            os.execv(sys.executable, [sys.executable] + sys.argv)  # Restart...
+            time.sleep(0.5)
+            try:
+                open_ftdi()
+                S.invalid_count = 0
+            except Exception as e:
+                logger.error("GPIO reinitialization failed, restarting... (%s)", e)
+                os.execv(sys.executable, [sys.executable] + sys.argv)  # Restart...
         return None
-    invalid_count = 0  # Reset invalid counter
-    return sum(distances) / len(distances) if distances else None
+    S.invalid_count = 0  # Reset invalid counter
+    return median(distances) if distances else None
+
+def start_loop_timer() -> None:
+    """Start periodic LOOP_TIME timer (uses timerfd on Python 3.13+, otherwise absolute deadlines)"""
+    if hasattr(os, "timerfd_create"):
+        S.loop_tfd = os.timerfd_create(time.CLOCK_MONOTONIC)
+        os.timerfd_settime_ns(S.loop_tfd, initial=LOOP_TIME_NS, interval=LOOP_TIME_NS)
+    S.loop_deadline_ns = time.monotonic_ns() + LOOP_TIME_NS
+
+def wait_loop_timer(ticks: int = 1) -> None:
+    """Block until 'ticks' LOOP_TIME ticks from now; if ticks were missed, skip them rather than catching up"""
+    if S.loop_tfd is not None:
+        if ticks > 1:  # Push next expiration out (keeping phase); re-arming also clears missed ticks
+            next_expiration_ns, _ = os.timerfd_gettime_ns(S.loop_tfd)
+            os.timerfd_settime_ns(S.loop_tfd, initial=next_expiration_ns + (ticks - 1) * LOOP_TIME_NS, interval=LOOP_TIME_NS)
+        expirations = int.from_bytes(os.read(S.loop_tfd, 8), sys.byteorder)
+        if expirations > 1:
+            logger.debug("Loop overran by %d ticks", expirations - 1)
+        return
+
+    S.loop_deadline_ns += (ticks - 1) * LOOP_TIME_NS
+    sleep_ns = S.loop_deadline_ns - time.monotonic_ns()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Sleeping for %.3f seconds", sleep_ns / 1e9)
+    if sleep_ns > 0:
+        time.sleep(sleep_ns / 1e9)
+        S.loop_deadline_ns += LOOP_TIME_NS
+    else:  # Overran
+        S.loop_deadline_ns = time.monotonic_ns() + LOOP_TIME_NS
 
 def get_datetime() -> str:
     """Return time string in format: YY-MM-DD HH:MM:SS"""
-    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    return time.strftime('%Y-%m-%d %H:%M:%S')
 
 #===============================================================================
 ### HAOKiosk Api calls
 
 # Setup HTTP retry
-session = requests.Session()
-retries = Retry(total=3, backoff_factor=0.1, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
-session.mount("http://", HTTPAdapter(max_retries=retries))
-
-def display_state() -> bool:
-    """Return display state"""
-    url = f"http://localhost:{REST_PORT}/is_display_on"
+# Note: calls are all to localhost, so retry at most once without backoff -- if local service is down
+# retrying more just stalls the caller; 429/500 are application errors, not transient ones
+# Note: POSTs have side effects (e.g., launching the browser), so they are only retried on connect errors
+retries = Retry(total=1, backoff_factor=0, status_forcelist=[502, 503, 504],
+                allowed_methods=frozenset(["GET"]), raise_on_status=False,
+                respect_retry_after_header=False)
+
+def make_session() -> requests.Session:
+    """Return HTTP session with retries and a small connection pool for the local endpoints"""
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(max_retries=retries))
+    # Dedicated small connection pool for the two local endpoints (REST API and HA)
+    # Note: more specific prefixes take precedence over "http://"
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retries, pool_block=False)
+    session.mount(f"http://localhost:{REST_PORT}", adapter)
+    session.mount(f"http://localhost:{HA_PORT}", adapter)
+    # Note: HA uses a different bearer token, so pass HA_HEADERS per call (overrides session header)
+    session.headers["Authorization"] = f"Bearer {REST_BEARER_TOKEN}"
+    return session
+
+class ThreadSession(threading.local):  # pylint: disable=too-few-public-methods
+    """Per-thread HTTP session (requests.Session is not thread-safe, so main loop and http_worker each get one)"""
+    def __init__(self) -> None:
+        self.session = make_session()
+
+http = ThreadSession()
+
+# Build headers and URLs once rather than on every call
+HA_HEADERS: dict[str, str] = {"Authorization": f"Bearer {HA_BEARER_TOKEN}"}
+HA_STATES_URL: str = f"http://localhost:{HA_PORT}/api/states/"
+REST_URLS: dict[str, str] = {
+    command: f"http://localhost:{REST_PORT}/{command}"
+    for command in ("is_display_on", "display_on", "display_off", "disable_inputs", "enable_inputs",
+                    "mute_audio", "unmute_audio", "launch_url")
+}
+
+def rest_api(method: str, command: str, **kwargs: Any) -> dict[str, Any] | None:
+    """Call HAOS Kiosk REST API command. Return JSON response if successful, else None"""
     try:
-        response = session.get(
-            url,
-            headers={"Authorization": f"Bearer {REST_BEARER_TOKEN}"},
-            timeout = HTTP_TIMEOUT,
+        response = http.session.request(
+            method,
+            REST_URLS[command],
+            timeout = HTTP_TIMEOUT if method == "GET" else (HTTP_TIMEOUT, HTTP_POST_TIMEOUT),
+            **kwargs,
         )
         response.raise_for_status()
-        data = response.json()
-        if not data.get("success", False):  # Failed to get display state
-            logger.error("Failed to get display state")
-            return False
-        return data["display_on"] is True
+        data: dict[str, Any] = response.json()
     except (requests.RequestException, ValueError) as e:
         logger.error("HTTPRequest failed (%s)", e)
-        return False
+        return None
+    if not data.get("success", False):
+        logger.error("Failed REST command: %s", command)
+        return None
+    return data
+
+def display_state() -> bool:
+    """Return display state"""
+    data = rest_api("GET", "is_display_on")
+    return data is not None and data.get("display_on") is True
 
-current_display: bool | None  = None  # Start in unknown state
 def display_state_print() -> None:
     """Print display state"""
-    global current_display
-    try:
-        current_display = display_state()
-        if current_display is True:
-            print(f"[{get_datetime()}] Display is ON")
-        else:
-            print(f"[{get_datetime()}] Display is OFF")
-    except (requests.RequestException, ValueError) as e:
-        logger.error("Display is INVALID (%s)", e)
+    S.display = display_state()
+    if S.display is True:
+        print(f"[{get_datetime()}] Display is ON")
+    else:
+        print(f"[{get_datetime()}] Display is OFF")
 
 def display_on() -> bool:
     """Turn display on"""
-    url = f"http://localhost:{REST_PORT}/display_on"
-    try:
-        response = session.post(
-            url,
-            headers={"Authorization": f"Bearer {REST_BEARER_TOKEN}"},
-            timeout = HTTP_TIMEOUT,
-        )
-        response.raise_for_status()
-        data = response.json()
-        if not data.get("success", False):  # Failed to turn on display
-            logger.error("Failed to turn on display")
-            return False
-        return True
-    except (requests.RequestException, ValueError) as e:
-        logger.error("HTTPRequest failed (%s)", e)
-        return False
+    return rest_api("POST", "display_on") is not None
 
 def display_off() -> bool:
     """Turn display off"""
-    url = f"http://localhost:{REST_PORT}/display_off"
-    try:
-        response = session.post(
-            url,
-            headers={"Authorization": f"Bearer {REST_BEARER_TOKEN}"},
-            timeout = HTTP_TIMEOUT,
-        )
-        response.raise_for_status()
-        data = response.json()
-        if not data.get("success", False):  # Failed to turn off display
-            logger.error("Failed to turn on display")
-            return False
-        return True
-    except (requests.RequestException, ValueError) as e:
-        logger.error("HTTPRequest failed (%s)", e)
-        return False
+    return rest_api("POST", "display_off") is not None
+
+def display_duration() -> timedelta:
+    """Return time (in whole seconds) since last display on/off and restart timer"""
+    old_display_time = S.last_display_time
+    S.last_display_time = time.monotonic()
+    return timedelta(seconds=int(S.last_display_time - old_display_time))
 
-last_display_time = datetime.now()
 def display_on_print(audio_too: bool=False) -> None:
     """Turn on display and show duration since last on"""
-    global last_display_time
-    old_display_time = last_display_time
-    last_display_time = datetime.now()
-    display_time_diff = last_display_time - old_display_time
-    display_time_diff = display_time_diff - timedelta(microseconds=display_time_diff.microseconds)
+    display_time_diff = display_duration()
 
     if display_on():
         msg = ""
         if audio_too:
-            ha_mute_audio(False)  # Also umute audio
+            run_in_background(ha_mute_audio, False)  # Also umute audio (queued since it can be slow)
             msg = " and restoring audio"
         print(f"[{get_datetime()}] ***Turning display ON{msg}*** (Duration: {display_time_diff})")
-        global current_display
-        current_display = True
+        S.display = True
     else:
         logger.error("FAILED to turn display ON")
+        display_state_print()  # Resync display state
 
 def display_off_print(audio_too: bool=False) ->None:
     """Turn off display and show duration since last off"""
-    global last_display_time
-    old_display_time = last_display_time
-    last_display_time = datetime.now()
-    display_time_diff = last_display_time - old_display_time
-    display_time_diff = display_time_diff - timedelta(microseconds=display_time_diff.microseconds)
+    display_time_diff = display_duration()
 
     if display_off():
         msg = ""
         if audio_too:
-            ha_mute_audio(True)  # Also mute audio
+            run_in_background(ha_mute_audio, True)  # Also mute audio (queued since it can be slow)
             msg = " and muting audio"
         print(f"[{get_datetime()}] ***Turning display OFF{msg}*** (Duration: {display_time_diff})")
-        global current_display
-        current_display = False
+        S.display = False
     else:
         logger.error("FAILED to turn display OFF")
+        display_state_print()  # Resync display state
 
 def ha_binary_sensor_state(sensor: str | None) -> bool | None:
     """Show state of binary sensor used to turn/off ultrasonic-governed display mechanism"""
     if sensor is None:
         return None
-    url = f"http://localhost:{HA_PORT}/api/states/{sensor}"
     try:
-        response = session.get(
-            url,
-            headers={"Authorization": f"Bearer {HA_BEARER_TOKEN}"},
+        response = http.session.get(
+            HA_STATES_URL + sensor,
+            headers=HA_HEADERS,
             timeout = HTTP_TIMEOUT,
         )
         response.raise_for_status()
@@ -397,73 +528,75 @@ def ha_binary_sensor_state(sensor: str | None) -> bool | None:
         logger.error("HTTP Request failed (%s)", e)
         return None
 
-current_inputs_disabled: bool | None = None  # Start in unknown state
 def ha_disable_inputs(state: bool) -> bool:
     """Disable/enable inputs"""
-    if state:
-        url = f"http://localhost:{REST_PORT}/disable_inputs"
-    else:
-        url = f"http://localhost:{REST_PORT}/enable_inputs"
-
-    try:
-        response = session.post(
-            url,
-            headers={"Authorization": f"Bearer {REST_BEARER_TOKEN}"}
-        )
-        response.raise_for_status()
-        data = response.json()
-        if not data.get("success", False):  # Failed to enable/disable inputs
-            logger.error("Failed to %s inputs", {"disable" if state else "enable"})
-            return False
-        global current_inputs_disabled
-        current_inputs_disabled = state
-        return True
-    except (requests.RequestException, ValueError):
+    if rest_api("POST", "disable_inputs" if state else "enable_inputs") is None:
         return False
+    S.inputs_disabled = state
+    return True
 
-current_mute: bool | None = None  # Start in unknown state
 def ha_mute_audio(state: bool) -> bool:
     """Mute/unmute audio. Return True on success"""
-    if state:
-        url = f"http://localhost:{REST_PORT}/mute_audio"
-    else:
-        url = f"http://localhost:{REST_PORT}/unmute_audio"
-
-    try:
-        response = session.post(
-            url,
-            headers={"Authorization": f"Bearer {REST_BEARER_TOKEN}"}
-        )
-        response.raise_for_status()
-        data = response.json()
-        if not data.get("success", False):  # Failed to mute/unmute audio
-            logger.error("Failed to %s audio", {"mute" if state else "unmute"})
-            return False
-        global current_mute
-        current_mute = state
-        return True
-    except (requests.RequestException, ValueError):
+    if rest_api("POST", "mute_audio" if state else "unmute_audio") is None:
         return False
+    S.mute = state
+    return True
 
 def ha_launch_url(site: str) -> bool:
     """Launch url"""
-    url = f"http://localhost:{REST_PORT}/launch_url"
-    try:
-        response = session.post(
-            url,
-            headers={"Authorization": f"Bearer {REST_BEARER_TOKEN}"},
-            json={"url": site}
-        )
-        response.raise_for_status()
-        data = response.json()
-        if not data.get("success", False) or not data.get("result", {}).get("success", False):  # Failed to launch url
-            logging.debug("Failed to launch_url: %s", url)
-            return False
-        stdout_text = data["result"].get("stdout", "")
-        return "Monitor is On" in stdout_text
-    except (requests.RequestException, ValueError) as e:
-        logger.error("HTTPRequest failed (%s)", e)
-        return False
+    data = rest_api("POST", "launch_url", json={"url": site})
+    return data is not None and data.get("result", {}).get("success", False) is True
+
+#===============================================================================
+### Background HTTP workers
+# Run REST calls from the main loop in background threads so that HTTP
+# latency (up to HTTP_POST_TIMEOUT per call) doesn't delay distance measurements
+# Note: display on/off get their own worker so that a slow POST (e.g., disable_inputs)
+# can't hold them up; each worker preserves the order of its queued calls
+
+HttpQueue = queue.SimpleQueue[tuple[Callable[..., Any], tuple[Any, ...]] | None]  # None = stop
+http_queue: HttpQueue = queue.SimpleQueue()     # Inputs, audio, and launch_url calls
+display_queue: HttpQueue = queue.SimpleQueue()  # Display on/off calls
+def http_worker(q: HttpQueue) -> None:
+    """Run REST calls queued on 'q' until stopped"""
+    while (item := q.get()) is not None:
+        func, args = item
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error("%s failed (%s)", func.__name__, e)
+
+http_threads: dict[HttpQueue, threading.Thread] = {
+    q: threading.Thread(target=http_worker, args=(q,), daemon=True) for q in (http_queue, display_queue)
+}
+
+def stop_http_workers() -> None:
+    """Drop REST calls still queued, then stop http workers and wait for any call in progress"""
+    for q, thread in http_threads.items():
+        while True:
+            try:
+                item = q.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                logger.warning("Dropping queued call: %s%s", item[0].__name__, item[1])
+        if thread.is_alive():
+            q.put(None)
+    deadline = time.monotonic() + HTTP_POST_TIMEOUT
+    for thread in http_threads.values():
+        if thread.is_alive():
+            thread.join(max(0, deadline - time.monotonic()))
+            if thread.is_alive():
+                logger.warning("Background REST call still running after %ds", HTTP_POST_TIMEOUT)
+
+def run_in_background(func: Callable[..., Any], *args: Any) -> None:
+    """Queue REST call to be run by http_worker"""
+    http_queue.put((func, args))
+
+def queue_display(state: bool, audio_too: bool=False) -> None:
+    """Queue turning display on/off. Display state is unknown (None) until the call completes"""
+    S.display = None  # Avoid re-queuing while pending
+    display_queue.put((display_on_print if state else display_off_print, (audio_too,)))
 
 #===============================================================================
 ### Main loop
@@ -472,8 +605,11 @@ def main()-> None:
     """Main event loop"""
 
     # Setup ultrasonic sensor
+    if TRIG_PIN not in (4, 6, 7):
+        logger.error("TRIG_PIN must be 4, 6, or 7 (AD4, AD6, AD7) since ECHO is fixed at AD5...exiting (got %d)", TRIG_PIN)
+        sys.exit(1)
     try:
-        gpio.configure('ftdi://ftdi:232h/1', direction=TRIG_MASK)  # TRIG = output, ECHO = input
+        open_ftdi()  # TRIG = output, ECHO = input
     except Exception as e:
         logger.error("Ultrasonic trigger GPIO initialization failed...exiting (%s)", e)
         sys.exit(1)
@@ -482,13 +618,18 @@ def main()-> None:
     count = 0
     binary_sensor_state = None
 
-    global current_url
+    for thread in http_threads.values():
+        thread.start()
+
+    # Get initial display state
+    # Afterwards, state is tracked from our own display on/off calls and only resynced if one fails
+    display_state_print()
+
     # Main event loop
+    start_loop_timer()
     while True:
-        loop_start = time.monotonic()
         loop_num += 1
         if not loop_num % 60:  # HA_BINARY_SENSOR state once a minute
-                               # Also, update display state in case gets out of sync
             old_binary_sensor_state = binary_sensor_state
             binary_sensor_state = ha_binary_sensor_state(HA_BINARY_SENSOR)
             if binary_sensor_state is not None and binary_sensor_state != old_binary_sensor_state:  # Status of binary_sensor_state changed
@@ -496,30 +637,32 @@ def main()-> None:
                 print(f"[{date_time}] '{HA_BINARY_SENSOR_FRIENDLY_NAME}' = {binary_sensor_state}")
                 if HA_DISPLAY_TOGGLE is not None:
                     if binary_sensor_state == HA_DISPLAY_TOGGLE:
-                        display_on_print(audio_too=ULTRASONIC_AUDIO and HA_AUDIO_TOGGLE is None)  # Turn on display (because need to keep it always on)
+                        queue_display(True, audio_too=ULTRASONIC_AUDIO and HA_AUDIO_TOGGLE is None)  # Turn on display (because need to keep it always on)
                 if HA_INPUTS_TOGGLE is not None:
                     state = binary_sensor_state == HA_INPUTS_TOGGLE
-                    ha_disable_inputs(state)
+                    run_in_background(ha_disable_inputs, state)
                     print(f"[{date_time}] ***{"Disabling" if state else "Enabling"} inputs***")
                 if HA_AUDIO_TOGGLE is not None:
                     state = binary_sensor_state == HA_AUDIO_TOGGLE
-                    ha_mute_audio(state)
+                    run_in_background(ha_mute_audio, state)
                     print(f"[{date_time}] ***{"Muting" if state else "Unmuting"} audio***")
                 if HA_ROTATE_TOGGLE is not None and binary_sensor_state != HA_ROTATE_TOGGLE:  # Reset to first url
-                    current_url = ROTATE_URL_LIST[0]
-                    ha_launch_url(current_url) # Restore default (first) url
-                    print(f"[{date_time}] Restoring: {current_url}")
-
-        if not binary_sensor_state and not loop_num % 300:
-            display_state_print()  # Set and show display state every 300 seconds
+                    S.url = ROTATE_URL_LIST[0]
+                    run_in_background(ha_launch_url, S.url) # Restore default (first) url
+                    print(f"[{date_time}] Restoring: {S.url}")
 
-        if current_display is True and HA_ROTATE_TOGGLE is not None and binary_sensor_state == HA_ROTATE_TOGGLE and not loop_num % ROTATE_FREQ: # Rotate url
-            current_url = ROTATE_URL_LIST[(loop_num // ROTATE_FREQ) % len(ROTATE_URL_LIST)]
-            ha_launch_url(current_url)
-            print(f"[{get_datetime()}] Rotating url: {current_url}")
+        if S.display is True and HA_ROTATE_TOGGLE is not None and binary_sensor_state == HA_ROTATE_TOGGLE and not loop_num % ROTATE_FREQ: # Rotate url
+            S.url = ROTATE_URL_LIST[(loop_num // ROTATE_FREQ) % len(ROTATE_URL_LIST)]
+            run_in_background(ha_launch_url, S.url)
+            print(f"[{get_datetime()}] Rotating url: {S.url}")
 
         if HA_DISPLAY_TOGGLE is not None and binary_sensor_state == HA_DISPLAY_TOGGLE:  # Avoid calculating distance & turning on/off display
-            time.sleep(LOOP_TIME)
+            # Nothing to do until next HA_BINARY_SENSOR check (or url rotation), so sleep until then
+            skip = 60 - loop_num % 60
+            if HA_ROTATE_TOGGLE is not None and binary_sensor_state == HA_ROTATE_TOGGLE:
+                skip = min(skip, ROTATE_FREQ - loop_num % ROTATE_FREQ)
+            wait_loop_timer(skip)
+            loop_num += skip - 1
             continue
 
         distance = measure_distance()
@@ -529,21 +672,17 @@ def main()-> None:
             if distance < NEAR_ON_DIST:
                 count = max(count, 0)
                 count += 1
-                if current_display is False and count >= COUNT_ON_THRESH:
-                    display_on_print(audio_too=ULTRASONIC_AUDIO)  # Turn ON display
+                if S.display is False and count >= COUNT_ON_THRESH:
+                    queue_display(True, audio_too=ULTRASONIC_AUDIO)  # Turn ON display
             elif distance > FAR_OFF_DIST:
                 count = min(count, 0)
                 count -= 1
-                if current_display is True and count <= -COUNT_OFF_THRESH:
-                    display_off_print(audio_too=ULTRASONIC_AUDIO)  # Turn OFF display
+                if S.display is True and count <= -COUNT_OFF_THRESH:
+                    queue_display(False, audio_too=ULTRASONIC_AUDIO)  # Turn OFF display
         else:
             print("Distance: Invalid")
 
-        loop_duration = time.monotonic() - loop_start
-        sleep_time = max(0, LOOP_TIME - loop_duration)
-        logger.debug("Sleeping for %.3f seconds", sleep_time)
-        if sleep_time > 0:
-            time.sleep(sleep_time)
+        wait_loop_timer()
 
 #===============================================================================
 
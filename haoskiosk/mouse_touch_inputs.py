@@ -369,6 +369,11 @@ from functools import wraps
 from typing import Any, cast, Callable, ClassVar, Final, Iterator, NotRequired, Protocol, Self, Sequence, Type, TypeAlias, TypedDict, TypeVar
 from Xlib import display                  #type: ignore[import-untyped] #pylint: disable=import-error
 from Xlib.xobject.drawable import Window  #type: ignore[import-untyped] #pylint: disable=import-error
+try:  # Optional: send D-Bus method calls directly instead of forking 'dbus-send'
+    from jeepney import DBusAddress, MessageFlag, new_method_call  #type: ignore[import-not-found] #pylint: disable=import-error
+    from jeepney.io.blocking import open_dbus_connection           #type: ignore[import-not-found] #pylint: disable=import-error
+except ImportError:
+    DBusAddress = MessageFlag = new_method_call = open_dbus_connection = None  # pylint: disable=invalid-name
 #-------------------------------------------------------------------------------
 __version__ = "1.3.0"
 __author__ = "Jeff Kosowsky"
@@ -528,6 +533,10 @@ def is_valid_url(url: str) -> bool:
 #### Globals
 GESTURE_SEP = "_"
 _registry_lock: threading.RLock = threading.RLock()
+_dbus_lock: threading.Lock = threading.Lock()
+_dbus_conn: Any = None  # Cached jeepney session bus connection (opened lazily)
+ONBOARD_DBUS_ADDRESS: Final = DBusAddress("/org/onboard/Onboard/Keyboard", bus_name="org.onboard.Onboard",
+                                          interface="org.onboard.Onboard.Keyboard") if DBusAddress is not None else None
 
 # ----------------------------------------------------------------------
 # Internally-defined, User callable functions
@@ -729,9 +738,35 @@ def handle_screenshot(filename: str | None = None, quality: int | None = None, d
 @register_function("toggle_keyboard")
 def handle_toggle_keyboard(timeout: int | None = None, *, _cmd_name: str = "unknown") -> None:
     """Toggle onscreen keyboard."""
+    if open_dbus_connection is not None and _dbus_toggle_keyboard():
+        debug(2, f"Execution success: {_cmd_name}")
+        return
     cmd = ["dbus-send", "--type=method_call", "--dest=org.onboard.Onboard", "/org/onboard/Onboard/Keyboard", "org.onboard.Onboard.Keyboard.ToggleVisible"]
     _run_subprocess(cmd, timeout=timeout, description=_cmd_name)
 
+def _dbus_toggle_keyboard() -> bool:
+    """Send Onboard ToggleVisible over a cached session bus connection; return False to fall back to dbus-send."""
+    global _dbus_conn  # pylint: disable=global-statement
+    with _dbus_lock:
+        try:
+            if _dbus_conn is None:
+                _dbus_conn = open_dbus_connection(bus="SESSION")
+            msg = new_method_call(ONBOARD_DBUS_ADDRESS, "ToggleVisible")
+            # Note: like 'dbus-send' without '--print-reply', don't ask for a reply (else unread replies pile up
+            # on the cached connection); so, as with 'dbus-send', Onboard not running is not detected
+            msg.header.flags |= MessageFlag.no_reply_expected
+            _dbus_conn.send(msg)
+            return True
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            debug(1, f"D-Bus send failed, falling back to dbus-send: {e}")
+            if _dbus_conn is not None:
+                try:
+                    _dbus_conn.close()
+                except Exception:  # pylint: disable=broad-exception-caught
+                    pass
+                _dbus_conn = None
+            return False
+
 @register_function("toggle_audio")
 def handle_toggle_audio(timeout: int | None = None, *, _cmd_name: str = "toggle_audio") -> None:
     """Toggle mute state of the default audio sink."""
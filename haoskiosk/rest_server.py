@@ -17,7 +17,7 @@
                                        "delay": <non-negative integer>}
    GET  /current_processes
    POST /run_command       {"cmd": "<command>", "cmd_timeout": <seconds>}
-   POST /run_commands      {"cmds": ["cmd1", "cmd2", ...], "cmd_timeout": <seconds>}
+   POST /run_commands      {"cmds": ["cmd1", "cmd2", ...], "cmd_timeout": <seconds>, "parallel": <bool>}
    POST /disable_inputs
    POST /enable_inputs
    POST /mute_audio
@@ -53,6 +53,7 @@
 #-------------------------------------------------------------------------------
 from __future__ import annotations
 import asyncio
+import hmac
 import inspect
 import ipaddress
 import json
@@ -64,11 +65,26 @@ import shutil
 import signal
 import subprocess
 import sys
+import threading
 from contextlib import suppress
 from datetime import datetime
-from functools import wraps
+from functools import lru_cache, wraps
 from typing import Any, Awaitable, cast, Callable, Final, Literal, TypedDict, TypeVar
 from aiohttp import web  #type: ignore[import-not-found] #pylint: disable=import-error
+try:
+    import orjson  #type: ignore[import-not-found] #pylint: disable=import-error
+except ImportError:  # Fall back to stdlib json
+    orjson = None
+try:
+    import uvloop  #type: ignore[import-not-found] #pylint: disable=import-error
+except ImportError:  # Fall back to stdlib asyncio event loop
+    uvloop = None
+try:
+    from Xlib import display as xdisplay  #type: ignore[import-untyped] #pylint: disable=import-error
+    from Xlib import error as xerror      #type: ignore[import-untyped] #pylint: disable=import-error
+    from Xlib.ext import dpms             #type: ignore[import-untyped] #pylint: disable=import-error
+except ImportError:  # Fall back to 'xset -q'
+    xdisplay = None
 
 #-------------------------------------------------------------------------------
 __version__ = "1.3.0"
@@ -91,6 +107,10 @@ ALLOW_ALL_USER_COMMANDS: bool = os.getenv("ALLOW_ALL_USER_COMMANDS", "false").lo
 ### Other Globals
 MAX_CONCURRENT_COMMANDS: int = 5
 SHORT_TIMEOUT: int = 5  # Timeout used for simple commands
+MAX_COMMAND_OUTPUT: int = 1 << 20  # Max bytes of stdout (and of stderr) kept per command; rest is read and discarded
+MAX_REQUEST_SIZE: int = 64 << 10  # Max request body bytes (aiohttp default is 1MB); payloads are small JSON objects
+WHICH_CACHE_SIZE: int = 512  # Max programs whose PATH lookup is cached
+MAX_CACHED_COMMAND_LENGTH: int = 1024  # Longer command strings are parsed without caching
 
 DEFAULT_LAUNCH_URL = f"{(os.getenv('HA_URL') or 'about:blank').rstrip('/')}/{os.getenv('HA_DASHBOARD') or ''}".strip('/')
 
@@ -101,13 +121,17 @@ DEFAULT_LAUNCH_URL = f"{(os.getenv('HA_URL') or 'about:blank').rstrip('/')}/{os.
 
 ## Restrict paths to specific, non-system bins
 ALLOWED_PATHS = {"/bin", "/usr/bin", "/usr/local/bin"} # Executables must be in these directories
+ALLOWED_PATH_PREFIXES: Final[tuple[str, ...]] = tuple(sorted(path.rstrip("/") + "/" for path in ALLOWED_PATHS))
 
 ## Commands that are white-listed -- all others are blocked (Note: set to ".*" to allow all or "" to block all)
 DEFAULT_COMMAND_WHITELIST_REGEX = r"cat|date|dbus-send|echo|false|grep|head|ls|luakit|notify-send|ping|ping6|ps|pstree|sleep|tail|test|top|tree|xdotool|xset"
 COMMAND_WHITELIST_REGEX = os.getenv("COMMAND_WHITELIST", DEFAULT_COMMAND_WHITELIST_REGEX).strip()
 
 COMPILED_WHITELIST_REGEX: re.Pattern[str] | None = None
+COMMAND_WHITELIST_SET: frozenset[str] | None = None  # Set if whitelist regex is just an alternation of literal names
 if COMMAND_WHITELIST_REGEX:
+    if re.fullmatch(r"[\w-]+(?:\|[\w-]+)*", COMMAND_WHITELIST_REGEX):
+        COMMAND_WHITELIST_SET = frozenset(COMMAND_WHITELIST_REGEX.split("|"))
     COMMAND_WHITELIST_REGEX = '^(?:' + COMMAND_WHITELIST_REGEX + ')$'  # Make sure starts with '^' and ends with '$'
     try:
         COMPILED_WHITELIST_REGEX = re.compile(COMMAND_WHITELIST_REGEX)
@@ -117,18 +141,20 @@ if COMMAND_WHITELIST_REGEX:
 
 ## Commands blocked (unless 'ALLOW_ALL_USER_COMMANDS' is True)
 # Note we only need to consider commands in ALLOWED_PATHS
-COMPILED_BLACKLIST_REGEX: Final[re.Pattern[str]] = re.compile(
-    r"^(?:"  # Always pin beginning
-    r"python[\d.]+|"
-    r"ash|bash|sh|su|"
-    r"env|exec|"
-    r"kill|killall|pkill|"
-    r"cp|chmod|chown|dd|ln|mv|rm|tar|"
-    r"mount|umount|"
-    r"curl|nc|wget|"
-    r"find|xargs"
-    r")$" # Always pin end
-)
+# Note: python and versioned pythons (e.g., python3, python3.12) are handled in 'is_blacklisted'
+COMMAND_BLACKLIST_SET: Final[frozenset[str]] = frozenset({
+    "ash", "bash", "sh", "su",
+    "env", "exec",
+    "kill", "killall", "pkill",
+    "cp", "chmod", "chown", "dd", "ln", "mv", "rm", "tar",
+    "mount", "umount",
+    "curl", "nc", "wget",
+    "find", "xargs",
+})
+
+def is_blacklisted(prog: str) -> bool:
+    """Return True if program is in blacklist (or is python<version>)"""
+    return prog in COMMAND_BLACKLIST_SET or (prog.startswith("python") and not prog[6:].strip("0123456789."))
 
 # Allowed Redirections
 SAFE_REDIRECT_REGEX: Final[re.Pattern[str]] = re.compile(
@@ -146,9 +172,18 @@ SAFE_REDIRECT_REGEX: Final[re.Pattern[str]] = re.compile(
 SEPARATORS: frozenset[str] = frozenset({ "&&", "||", ";", "|", "&", "$(", "${", "`", "(", "{", "[[", "((" })
 SEP_REGEX: Final[re.Pattern[str]] = re.compile('(?:' + '|'.join(re.escape(op) for op in sorted(SEPARATORS, key=len, reverse=True)) + ')')
 
+# Characters that make 'shlex.split' differ from simple whitespace splitting
+SHLEX_QUOTE_CHARS: frozenset[str] = frozenset("\"'\\")
+FIRST_WORD_REGEX: Final[re.Pattern[str]] = re.compile(r"[^ \t\r\n]+")  # Word up to first shlex whitespace
+
+# Command strings that need a shell: quotes, spaces, backquotes, environment variables
+NEEDS_SHELL_REGEX: Final[re.Pattern[str]] = re.compile(r'["`\' ]|\$[^(]')
+
 DANGEROUS_SHELL_TOKENS: set[str] = { # Disallowed shell tokens if just expecting string arguments (used only in xset for now)
     ";", "&&", "||", "|", "&", "`", "$(", "${", ">", "<", "2>", "&>", "*?", "[",
 }
+# Single-pass scan for any dangerous token (longest first so e.g., '&&' is reported rather than '&')
+DANGEROUS_SHELL_REGEX: Final[re.Pattern[str]] = re.compile('|'.join(re.escape(tok) for tok in sorted(DANGEROUS_SHELL_TOKENS, key=len, reverse=True)))
 
 VALID_URL_REGEX: Final[re.Pattern[str]] = re.compile(
     r'^(https?://)?'                  # Optional scheme
@@ -160,9 +195,11 @@ VALID_URL_REGEX: Final[re.Pattern[str]] = re.compile(
     re.IGNORECASE
 )
 
+MAX_URL_LENGTH: int = 2048  # Bound regex work on untrusted input
+
 def is_valid_url(url: str) -> bool:
     """Validate URL format (allows http://, https://, bare domain/IP, path, query, fragment)."""
-    return bool(url == 'about:blank' or VALID_URL_REGEX.fullmatch(url.strip()))
+    return bool(url == 'about:blank' or (len(url) <= MAX_URL_LENGTH and VALID_URL_REGEX.fullmatch(url.strip())))
 
 # --------------------------------------------------------------------------- #
 # Setup
@@ -191,34 +228,72 @@ except Exception as e:
 ###  Concurrency control: limit number of simultaneous shell commands
 
 _command_semaphore = asyncio.Semaphore(MAX_CONCURRENT_COMMANDS)
-_active_processes: set[asyncio.subprocess.Process] = set()   # Track currently running subprocesses
+_active_count: int = 0  # Number of currently running subprocesses (Note: only changed from event loop thread)
+_background_tasks: set[asyncio.Task[Any]] = set()  # Hold references so fire-and-forget tasks aren't garbage collected
 
 # --------------------------------------------------------------------------- #
 # Helper Functions
 # --------------------------------------------------------------------------- #
+if orjson is not None:
+    json_dumps: Callable[[Any], bytes] = orjson.dumps
+    json_loads: Callable[[bytes], Any] = orjson.loads  # Note: orjson.JSONDecodeError is a subclass of ValueError
+else:
+    def json_dumps(obj: Any) -> bytes:
+        """Serialize obj to JSON bytes"""
+        return json.dumps(obj).encode()
+    json_loads = json.loads
+
+def json_body_response(body: bytes, status: int = 200) -> web.Response:
+    """Return JSON response from an already serialized body (e.g., precomputed for fixed responses)."""
+    return web.Response(body=body, status=status, content_type="application/json")
+
+def json_response(data: Any, status: int = 200) -> web.Response:
+    """Return JSON response (like 'web.json_response' but using orjson if available)."""
+    return json_body_response(json_dumps(data), status)
+
+@lru_cache(maxsize=512)
 def is_path_allowed(prog_path: str) -> bool:
     """Return True if binary is in an allowed directory."""
     try:
         real_path = os.path.realpath(prog_path)
-        return any(real_path.startswith(allowed + "/") for allowed in ALLOWED_PATHS)
+        return real_path.startswith(ALLOWED_PATH_PREFIXES)
     except Exception:
         return False
 
-def is_command_allowed(command_str: str) -> tuple[bool, str]:  #pylint: disable=too-many-return-statements
-    """ Return True if all programs called bycommand string are in the white list and not in the blacklist.
-        Also returns True if 'ALLOW_ALL_USER_COMMANDS' is True
+_which_cache: dict[tuple[str, str | None], str] = {}
+def which(prog: str, path_env: str | None) -> str:
     """
+    'shutil.which' with found paths cached (keyed on PATH too). Returns "" if not found
+    Note: misses are not cached, so a later-installed program is found and arbitrary user-supplied names can't fill the cache
+    """
+    key = (prog, path_env)
+    prog_path = _which_cache.get(key)
+    if prog_path is None:
+        prog_path = shutil.which(prog, path=path_env) or ""
+        if prog_path and len(_which_cache) < WHICH_CACHE_SIZE:
+            _which_cache[key] = prog_path
+    return prog_path
+
+def command_programs(command_str: str) -> frozenset[str]:
+    """Return the programs called by a (potentially compound) command string.
+        Note: short commands are cached since this is pure parsing (unlike the PATH-dependent checks in 'is_command_allowed');
+        long ones are not, so the cache can't pin large request bodies
+    """
+    if len(command_str) <= MAX_CACHED_COMMAND_LENGTH:
+        return _cached_command_programs(command_str)
+    return parse_command_programs(command_str)
 
-    if ALLOW_ALL_USER_COMMANDS:
-        return True, "All commands allowed"
-
-    # Extract all programs in the potentially compound command
+def parse_command_programs(command_str: str) -> frozenset[str]:
+    """Return the programs called by a (potentially compound) command string (uncached)."""
     programs = set()
     parts = SEP_REGEX.split(command_str)
     for part in parts:
         part = part.strip()
         if not part:
             continue
+        if SHLEX_QUOTE_CHARS.isdisjoint(part):  # Fast path: without quotes/escapes, first token is just the first word
+            programs.add(FIRST_WORD_REGEX.match(part).group())  # type: ignore[union-attr]
+            continue
         try:
             tokens = shlex.split(part)
             if tokens:
@@ -226,13 +301,26 @@ def is_command_allowed(command_str: str) -> tuple[bool, str]:  #pylint: disable=
                 programs.add(prog)
         except (ValueError, IndexError):
             continue
+    return frozenset(programs)
+
+_cached_command_programs = lru_cache(maxsize=1024)(parse_command_programs)
+
+def is_command_allowed(command_str: str) -> tuple[bool, str]:  #pylint: disable=too-many-return-statements
+    """ Return True if all programs called bycommand string are in the white list and not in the blacklist.
+        Also returns True if 'ALLOW_ALL_USER_COMMANDS' is True
+    """
+
+    if ALLOW_ALL_USER_COMMANDS:
+        return True, "All commands allowed"
 
+    # Extract all programs in the potentially compound command
+    programs = command_programs(command_str)
     if not programs:
         return False, "No programs found"
 
     for prog in programs:
         # 1. Program not found
-        prog_path = shutil.which(prog) or ""
+        prog_path = which(prog, os.environ.get("PATH"))
         if not prog_path:
             return False, f"Program not found: {prog}"
 
@@ -243,12 +331,13 @@ def is_command_allowed(command_str: str) -> tuple[bool, str]:  #pylint: disable=
         # 3. Whitelist — Allow if whitelisted; deny if not
         # Note whitelist overrides blacklist if set
         if COMPILED_WHITELIST_REGEX is not None:
-            if not COMPILED_WHITELIST_REGEX.fullmatch(prog):
+            if not (prog in COMMAND_WHITELIST_SET if COMMAND_WHITELIST_SET is not None
+                    else COMPILED_WHITELIST_REGEX.fullmatch(prog)):
                 return False, f"Program not in Whitelist: {prog}"
             continue
 
         # 4. Blacklist — Deny if blacklisted
-        if COMPILED_BLACKLIST_REGEX.fullmatch(prog):
+        if is_blacklisted(prog):
             return False, f"Blacklisted program: {prog}"
 
 
@@ -260,11 +349,29 @@ def is_command_allowed(command_str: str) -> tuple[bool, str]:  #pylint: disable=
 
 CommandKey = Literal["url", "timeout", "args", "cmd", "cmds", "cmd_timeout"]
 
+async def read_limited(reader: asyncio.StreamReader | None, limit: int) -> tuple[bytes, bool]:
+    """Read stream to EOF in chunks keeping at most 'limit' bytes. Returns (data, truncated)"""
+    if reader is None:
+        return b"", False
+    buf = bytearray()
+    truncated = False
+    while chunk := await reader.read(65536):
+        room = limit - len(buf)
+        if len(chunk) > room:
+            truncated = True
+            chunk = chunk[:room]
+        buf += chunk
+    return bytes(buf), truncated
+
 async def execute_command(command: str|list[str], *, timeout: int | None = None, allow_command: bool = False,
-                          print_stdout: bool = True, print_stderr: bool = True, log_prefix: str = "execute_command") -> dict[str, Any]:
+                          print_stdout: bool = True, print_stderr: bool = True,
+                          capture: Literal["both", "stdout", "stderr", "none"] = "both", max_output: int = MAX_COMMAND_OUTPUT,
+                          log_prefix: str = "execute_command") -> dict[str, Any]:
     """
     Execute a shell command safely with concurrency limiting and optional timeout.
     Returns dict containing: success, stdout, stderr, returncode, and possibly error.
+    Output not captured (see 'capture') is sent to /dev/null and returned as ""
+    Output beyond 'max_output' bytes per stream is discarded and 'truncated' is set True
     Enforces security model unless ALLOW_ALL_USER_COMMANDS is True
     """
 
@@ -272,13 +379,14 @@ async def execute_command(command: str|list[str], *, timeout: int | None = None,
     if isinstance(command, list):
         if not command:
             return {"success": False, "error": "empty command list"}
-        cmd_str = " ".join(shlex.quote(str(x)) for x in command)
+        # Note: string form is only needed for the security check (fixed internal argv lists skip it)
+        cmd_str = "" if allow_command else " ".join(shlex.quote(str(x)) for x in command)
         shell = False  # list form so NEVER shell
     else: # String
         cmd_str = command.strip()
         if not cmd_str:
             return {"success": False, "error": "empty command string"}
-        needs_shell = bool(re.search(r'["`\' ]|\$[^(]', cmd_str))  #Needs shell if quotes, spaces, backslashes, backquotes, environment variables
+        needs_shell = NEEDS_SHELL_REGEX.search(cmd_str) is not None
         shell = needs_shell or ALLOW_ALL_USER_COMMANDS
 
     if not allow_command:  # Check that command_allowed
@@ -289,53 +397,65 @@ async def execute_command(command: str|list[str], *, timeout: int | None = None,
 
     logging.info("[%s] Running (%s): %s", log_prefix, "shell" if shell else "exec", repr(command))
 
+    global _active_count  # pylint: disable=global-statement
+
+    # Only create pipes for output that is used
+    stdout_pipe = asyncio.subprocess.PIPE if capture in ("both", "stdout") else asyncio.subprocess.DEVNULL
+    stderr_pipe = asyncio.subprocess.PIPE if capture in ("both", "stderr") else asyncio.subprocess.DEVNULL
+
     async with _command_semaphore:
         if shell:
             proc = await asyncio.create_subprocess_shell(
                 cmd_str,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
+                stdout=stdout_pipe,
+                stderr=stderr_pipe,
             )
         else: # Always use exec with list form if shell = False
             args = command if isinstance(command, list) else shlex.split(cmd_str)
             proc = await asyncio.create_subprocess_exec(
                 *args,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
+                stdout=stdout_pipe,
+                stderr=stderr_pipe,
             )
 
-        _active_processes.add(proc)
+        _active_count += 1
         try:
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
-        except asyncio.TimeoutError:
+            async with asyncio.timeout(timeout):  # Note: None means no timeout
+                (stdout, stdout_truncated), (stderr, stderr_truncated), _ = await asyncio.gather(
+                    read_limited(proc.stdout, max_output), read_limited(proc.stderr, max_output), proc.wait())
+        except TimeoutError:
             logging.error("[%s] Timeout after %ds, killing process", log_prefix, timeout or 0)
             with suppress(ProcessLookupError):
                 proc.kill()
             await proc.wait()
             return {"success": False, "error": f"Timeout after {timeout}s"}
         finally:
-            _active_processes.discard(proc)
+            _active_count -= 1
 
-        stdout_str = stdout.decode(errors="replace").strip() if stdout else ""
-        stderr_str = stderr.decode(errors="replace").strip() if stderr else ""
+        # Note: strip bytes before decoding to avoid building an unstripped copy of the string
+        stdout_str = stdout.strip().decode(errors="replace") if stdout else ""
+        stderr_str = stderr.strip().decode(errors="replace") if stderr else ""
 
-        if logger.getEffectiveLevel() <= logging.INFO and print_stdout:  # Print stdout
-            for line in stdout_str.splitlines():  # Pretty-print output (HA style)
-                print(" " + line)
-        if logger.getEffectiveLevel() <= logging.ERROR and print_stderr:  # Print stderr
-            for line in stderr_str.splitlines():  # Pretty-print output (HA style)
-                print(" " + line)
+        # Pretty-print output (HA style) indented by one space, using a single write per stream
+        if print_stdout and stdout_str and logger.isEnabledFor(logging.INFO):  # Print stdout
+            sys.stdout.write(" " + stdout_str.replace("\n", "\n ") + "\n")
+        if print_stderr and stderr_str and logger.isEnabledFor(logging.ERROR):  # Print stderr
+            sys.stdout.write(" " + stderr_str.replace("\n", "\n ") + "\n")
 
         success = proc.returncode == 0
         if not success:
             logging.error("[%s] Failed (exit %d)", log_prefix, proc.returncode)
 
-        return {
+        result = {
             "success": success,
             "stdout": stdout_str,
             "stderr": stderr_str,
             "returncode": proc.returncode,
         }
+        if stdout_truncated or stderr_truncated:
+            logging.warning("[%s] Output truncated to %d bytes", log_prefix, max_output)
+            result["truncated"] = True
+        return result
 
 # --------------------------------------------------------------------------- #
 # Decorator for Internally Defined API endpoint functions
@@ -376,46 +496,44 @@ def register_function(
     required = required or []
     optional = optional or []
     validators = validators or {}
-    allowed_params = set(required) | set(optional)
+    required_params = frozenset(required)
+    allowed_params = required_params | frozenset(optional) | {"timeout"}  # Note always allow 'timeout'
+    # Normalize validators once to (key, test, err) tuples
+    validator_specs: tuple[tuple[str, Callable[[Any], bool], str], ...] = tuple(
+        (key, spec["test"], spec.get("err", f"{key} is invalid")) if isinstance(spec, dict) else (key, spec, f"{key} is invalid")
+        for key, spec in validators.items()
+    )
 
     fullname = prefix + "." + name  if prefix is not None else name
     def decorator(func: F) -> F:
-        sig = inspect.signature(func)
+        sig: inspect.Signature | None = None  # Only needed (and computed on first use) for shell function style calls
 
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
+            nonlocal sig
             # Case 1: REST style — first arg is dict (Payload)
             if args and isinstance(args[0], dict):
                 data = args[0]
             else:
                 # Case 2: Shell function style — bind args/kwargs
+                if sig is None:
+                    sig = inspect.signature(func)
                 bound = sig.bind(*args, **kwargs)
                 bound.apply_defaults()
                 data = bound.arguments
 
             # === Validation ===
-            missing = [k for k in required if k not in data]
+            missing = required_params - data.keys()
             if missing: # Missing parameters
-                raise ValueError(f"{fullname}: Missing required parameters: {missing}")
+                raise ValueError(f"{fullname}: Missing required parameters: {sorted(missing)}")
 
-            extra = [k for k in data if not k.startswith('_') and k not in allowed_params and k != "timeout"]
-            # Note always allow parameters beginning with '_' (internal) and 'timeout'
+            extra = [k for k in data.keys() - allowed_params if not k.startswith('_')]
+            # Note always allow parameters beginning with '_' (internal)
             if extra: # Extra parameters
                 raise ValueError(f"{fullname}: Unknown parameters: {extra}")
 
-            for key, spec in validators.items(): # Custom validation
-                if key not in data:
-                    continue
-
-                value = data[key]
-                if isinstance(spec, dict):
-                    test = spec["test"]
-                    err = spec.get("err", f"{key} is invalid")
-                else:
-                    test = spec
-                    err = f"{key} is invalid"
-
-                if not test(value):
+            for key, test, err in validator_specs: # Custom validation
+                if key in data and not test(data[key]):
                     raise ValueError(f"{fullname}: {err}")
 
             # === Smart timeout handling (only for internal functions) ===
@@ -464,27 +582,123 @@ async def handle_launch_url(data: Payload) -> dict[str, Any]:
     url = str(data["url"]) if data.get("url") else DEFAULT_LAUNCH_URL
     if url != "about:blank" and not url.startswith(("http://", "https://")):
         url = "http://" + url
-    asyncio.create_task(execute_command(["luakit", "-n", url], log_prefix="launch_url", allow_command=True))  # Run in the background
+    task = asyncio.create_task(execute_command(["luakit", "-n", url], capture="none", log_prefix="launch_url", allow_command=True))  # Run in the background
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
     result = {"success": True, "stdout": "", "stderr": "", "returncode": 0}
     return {"success": result["success"], "result": result}
 
 @register_function("refresh_browser")
 async def handle_refresh_browser(data: Payload) -> dict[str, Any]:  # pylint: disable=unused-argument
     """Send Ctrl+R to refresh browser."""
-    result = await execute_command( ["xdotool", "key", "--clearmodifiers", "ctrl+r"],
+    result = await execute_command( ["xdotool", "key", "--clearmodifiers", "ctrl+r"], capture="stderr",
                                     timeout=SHORT_TIMEOUT, log_prefix="refresh_browser", allow_command=True)
     return {"success": result["success"]}
 
 ### Display
+_xlib_display: Any = None  # Persistent X connection used for DPMS requests (opened on first use)
+_xlib_has_dpms: bool = xdisplay is not None  # False disables the Xlib fast path (Xlib missing or X server lacks DPMS)
+_xlib_errors: Any = None  # Collects X errors from requests without replies (which python-xlib doesn't raise)
+_xlib_lock: threading.Lock = threading.Lock()  # Held while an X request runs in a worker thread
+XLIB_BUSY: Final = object()  # Sentinel returned by a worker thread when another X request holds '_xlib_lock'
+def open_xlib_display() -> Any:
+    """Open the persistent X connection, checking once for the DPMS extension (None if unavailable)."""
+    global _xlib_display, _xlib_has_dpms, _xlib_errors  # pylint: disable=global-statement
+    d = xdisplay.Display()
+    if not d.has_extension("DPMS"):
+        logging.warning("X server has no DPMS extension, using xset instead")
+        _xlib_has_dpms = False
+        with suppress(Exception):
+            d.close()
+        return None
+    _xlib_errors = xerror.CatchError()
+    d.set_error_handler(_xlib_errors)
+    _xlib_display = d
+    return d
+
+def xlib_request_sync(request: Callable[[Any], Any]) -> Any:
+    """Run request(display) over the persistent X connection (None if Xlib unavailable or request fails)."""
+    if not _xlib_has_dpms:
+        return None
+    for _ in range(2):  # Retry once with a fresh connection (e.g., if X server restarted)
+        try:
+            d = _xlib_display if _xlib_display is not None else open_xlib_display()
+            return None if d is None else request(d)
+        except (xerror.ConnectionClosedError, OSError):  # Lost connection, so reconnect
+            close_xlib_display()
+        except Exception as e:
+            logging.debug("X request failed: %s", e)
+            return None
+    return None
+
+async def xlib_request(request: Callable[[Any], Any]) -> Any:
+    """
+    Run request(display) in a worker thread, bounded by SHORT_TIMEOUT (None if unavailable, fails, or times out).
+    Note: python-xlib does blocking socket I/O, so an unresponsive X server must not stall the event loop
+    """
+    if not _xlib_has_dpms:
+        return None
+    def run() -> Any:
+        # Note: acquire in the worker thread so the lock is never left held if the call is cancelled before it starts
+        if not _xlib_lock.acquire(blocking=False):  # Don't queue behind a stuck request
+            return XLIB_BUSY
+        try:
+            return xlib_request_sync(request)
+        finally:
+            _xlib_lock.release()
+    try:
+        result = await asyncio.wait_for(asyncio.to_thread(run), SHORT_TIMEOUT)
+    except TimeoutError:
+        logging.warning("X request timed out after %ds, using xset instead", SHORT_TIMEOUT)
+        return None
+    if result is XLIB_BUSY:
+        logging.warning("Previous X request still running, using xset instead")
+        return None
+    return result
+
+def close_xlib_display() -> None:
+    """Close the persistent X connection (if open)."""
+    global _xlib_display  # pylint: disable=global-statement
+    if _xlib_display is not None:
+        with suppress(Exception):
+            _xlib_display.close()
+        _xlib_display = None
+
+async def dpms_monitor_on() -> bool | None:
+    """
+    Return True if monitor is on as reported by DPMS over a persistent X connection (None if query fails).
+    Note: matches 'xset -q' which only reports 'Monitor is On' when DPMS is enabled
+    """
+    info = await xlib_request(lambda d: d.dpms_info())
+    if info is None:
+        return None
+    return bool(info.state) and info.power_level == dpms.DPMSModeOn
+
+async def dpms_force(on: bool) -> bool:
+    """Enable DPMS and force monitor on/off (same as 'xset dpms force on|off'); return False if request fails."""
+    def request(d: Any) -> bool:
+        _xlib_errors.reset()
+        d.dpms_enable()
+        d.dpms_force_level(dpms.DPMSModeOn if on else dpms.DPMSModeOff)
+        d.sync()  # Round trip so that any X errors from the above requests reach _xlib_errors
+        error = _xlib_errors.get_error()
+        if error is not None:
+            logging.debug("DPMS request failed: %s", error)
+        return error is None
+    return bool(await xlib_request(request))
+
+XLIB_SUCCESS_RESULT: Final = {"success": True, "stdout": "", "stderr": "", "returncode": 0}
+
 @register_function("is_display_on")  # GET endpoint – we register manually below
 async def handle_is_display_on(data: Payload) -> dict[str, Any]:  # pylint: disable=unused-argument
     """Return boolean whether monitor is currently on."""
-    result = await execute_command(["xset", "-q"], print_stdout=False,
-                                   timeout=SHORT_TIMEOUT, log_prefix="is_display_on", allow_command=True)
-    if not result["success"]:
-        return {"success": False, "error": "Failed to query display state"}
-
-    is_on = "Monitor is On" in result["stdout"]
+    is_on = await dpms_monitor_on()  # Fast path: no subprocess
+    if is_on is None:
+        result = await execute_command(["xset", "-q"], print_stdout=False, capture="stdout",
+                                       timeout=SHORT_TIMEOUT, log_prefix="is_display_on", allow_command=True)
+        if not result["success"]:
+            return {"success": False, "error": "Failed to query display state"}
+        is_on = "Monitor is On" in result["stdout"]
     logging.info("[is_display_on] Monitor is %s", "ON" if is_on else "OFF")
     return {"success": True, "display_on": is_on}
 
@@ -493,26 +707,32 @@ async def handle_display_on(data: Payload) -> dict[str, Any]:
     """Turn display on, optionally set blanking timeout. If 0, then disables timeout"""
     blank_timeout = data.get("timeout")
 
-    cmds = [ ["xset", "dpms", "force", "on"] ]
+    # Note: xset applies multiple options in order, so use a single invocation rather than one per option
+    cmd = ["xset", "dpms", "force", "on"]
     log_msg = ""
     if blank_timeout is None:
         pass
     elif blank_timeout == 0:
-        cmds += [ ["xset", "s", "off"], ["xset", "-dpms"] ]
+        cmd += ["s", "off", "-dpms"]
         log_msg = " Screen timeout disabled"
     elif blank_timeout > 0:
         t = str(blank_timeout)
-        cmds += [ ["xset", "s", t], ["xset", "dpms", t, t, t] ]
+        cmd += ["s", t, "dpms", t, t, t]
         log_msg = f" Screen timeout: {blank_timeout}s"
 
-    results = [await execute_command(cmd, timeout=SHORT_TIMEOUT, log_prefix="display_on", allow_command=True) for cmd in cmds]
+    if blank_timeout is None and await dpms_force(True):  # Fast path: no subprocess
+        result = dict(XLIB_SUCCESS_RESULT)
+    else:
+        result = await execute_command(cmd, capture="stderr", timeout=SHORT_TIMEOUT, log_prefix="display_on", allow_command=True)
     logging.info("[display_on]%s", log_msg)
-    return {"success": all(r["success"] for r in results), "results": results}
+    return {"success": result["success"], "results": [result]}
 
 @register_function("display_off")
 async def handle_display_off(data: Payload) -> dict[str, Any]:  # pylint: disable=unused-argument
     """Force display off immediately."""
-    result = await execute_command(["xset", "dpms", "force", "off"],
+    if await dpms_force(False):  # Fast path: no subprocess
+        return {"success": True}
+    result = await execute_command(["xset", "dpms", "force", "off"], capture="stderr",
                                    timeout=SHORT_TIMEOUT, log_prefix="display_off", allow_command=True)
     return {"success": result["success"]}
 
@@ -521,9 +741,9 @@ async def handle_xset(data: Payload) -> dict[str, Any]:
     """Run arbitrary xset command (sanitized)."""
     args = data["args"]
     # Block dangerous shell metacharacters — even with allow_all_user_commands=False
-    dangerous_tokens = [tok for tok in DANGEROUS_SHELL_TOKENS if tok in args]
+    dangerous_tokens = sorted(set(DANGEROUS_SHELL_REGEX.findall(args)))
     if dangerous_tokens:
-        return {"success": False, "error": "Forbidden shell metacharacters in xset args: {dangerous_tokens}"}
+        return {"success": False, "error": f"Forbidden shell metacharacters in xset args: {dangerous_tokens}"}
     args_list = shlex.split(args)  # Convert to list for safer execution
     result = await execute_command(["xset"] + args_list, timeout=SHORT_TIMEOUT, log_prefix="xset", allow_command=True)
     return {"success": result["success"], "result": result}
@@ -570,7 +790,7 @@ async def handle_screenshot(data: Payload) -> dict[str, Any]:
 @register_function("current_processes")  # GET endpoint
 async def handle_current_processes(data: Payload) -> dict[str, Any]:  # pylint: disable=unused-argument
     """Report number of currently running subprocesses."""
-    count = len(_active_processes)
+    count = _active_count
     logging.info(
         "[current_processes] %d active (max %d)", count, MAX_CONCURRENT_COMMANDS
     )
@@ -589,22 +809,28 @@ async def handle_run_command(data: Payload) -> dict[str, Any]:
     result = await execute_command(cmd, timeout=timeout, log_prefix="run_command")
     return {"success": result["success"], "result": result}
 
-@register_function("run_commands", required=["cmds"], optional=["cmd_timeout"],
-              validators={"cmd_timeout": lambda x: x is None or (isinstance(x, int) and x > 0)})
+@register_function("run_commands", required=["cmds"], optional=["cmd_timeout", "parallel"],
+              validators={"cmd_timeout": lambda x: x is None or (isinstance(x, int) and x > 0),
+                          "parallel": lambda x: x is None or isinstance(x, bool)})
 async def handle_run_commands(data: Payload) -> dict[str, Any]:
-    """Execute multiple user-supplied commands sequentially."""
+    """Execute multiple user-supplied commands sequentially (or concurrently if 'parallel' is True)."""
     raw_cmds = data["cmds"]
     if not isinstance(raw_cmds, list):
         return {"success": False, "error": "'cmds' must be a list"}
 
     timeout = data.get("cmd_timeout")
-    results = []
-    for cmd in raw_cmds:
+
+    async def run(cmd: Any) -> dict[str, Any]:
         if not isinstance(cmd, (str, list)):
-            results.append({"success": False, "error": f"Invalid command type ({type(cmd)}): {cmd!r}"})
-            continue
-        res = await execute_command(cmd, timeout=timeout, log_prefix="run_commands")
-        results.append(res)
+            return {"success": False, "error": f"Invalid command type ({type(cmd)}): {cmd!r}"}
+        return await execute_command(cmd, timeout=timeout, log_prefix="run_commands")
+
+    if data.get("parallel"):  # Concurrency still limited by _command_semaphore; results stay in 'cmds' order
+        # Note: one command failing to spawn shouldn't discard the results of the others
+        results = [r if isinstance(r, dict) else {"success": False, "error": f"{type(r).__name__}: {r}"}
+                   for r in await asyncio.gather(*(run(cmd) for cmd in raw_cmds), return_exceptions=True)]
+    else:
+        results = [await run(cmd) for cmd in raw_cmds]
 
     return {"success": all(r["success"] for r in results), "results": results}
 
@@ -631,6 +857,8 @@ def get_input_devices() -> dict[str, str]:
 
     return devices
 
+EVTEST_GRAB_REGEX: Final[re.Pattern[str]] = re.compile(r'^\s*(\d+)\s+evtest\s+--grab\s+(/dev/input/event\d+)(?:\s|$)', re.MULTILINE)
+
 async def get_running_evtest_processes(timeout: int = SHORT_TIMEOUT) -> dict[str, list[int]]:
     """Returns { '/dev/input/eventX': [pid1, pid2, ...] } for active evtest --grab processes."""
     try:
@@ -639,12 +867,13 @@ async def get_running_evtest_processes(timeout: int = SHORT_TIMEOUT) -> dict[str
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE,
         )
-        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        async with asyncio.timeout(timeout):
+            stdout, stderr = await proc.communicate()
         if proc.returncode != 0:
             logger.warning("ps failed with code %d: %s", proc.returncode, stderr.decode(errors="replace"))
             return {}
         output = stdout.decode(errors="replace")
-    except asyncio.TimeoutError:
+    except TimeoutError:
         logger.warning("ps timed out after %s seconds", timeout)
         return {}
     except (OSError, subprocess.SubprocessError) as e:
@@ -652,8 +881,7 @@ async def get_running_evtest_processes(timeout: int = SHORT_TIMEOUT) -> dict[str
         return {}
 
     result: dict[str, list[int]] = {}
-    pattern = re.compile(r'^\s*(\d+)\s+evtest\s+--grab\s+(/dev/input/event\d+)(?:\s|$)', re.MULTILINE)
-    matches = pattern.findall(output)
+    matches = EVTEST_GRAB_REGEX.findall(output)
 
     for pid_str, path in matches:
         try:
@@ -754,6 +982,8 @@ async def handle_mute_audio(data: Payload) -> dict[str, Any]:  # pylint: disable
         "results": results,
     }
 
+SINK_VOLUME_REGEX: Final[re.Pattern[str]] = re.compile(r"(\S+):\s*\d+\s*/\s*(\d+)%\s*/")  # Parse 'pactl get-sink-volume' output
+
 @register_function("unmute_audio", optional=["volume"],
     validators={"volume": lambda x: x is None or (isinstance(x, int) and 0 <= x <= 150)})
 async def handle_unmute_audio(data: Payload) -> dict[str, Any]:
@@ -780,8 +1010,7 @@ async def handle_unmute_audio(data: Payload) -> dict[str, Any]:
         msg = "Audio unmuted"
         volume_raw = results[-2]["stdout"]
         if volume_raw.startswith("Volume"):
-            vol_pattern = re.compile(r"(\S+):\s*\d+\s*/\s*(\d+)%\s*/")
-            volumes = {name: int(pct) for name, pct in vol_pattern.findall(volume_raw)}
+            volumes = {name: int(pct) for name, pct in SINK_VOLUME_REGEX.findall(volume_raw)}
             msg = f"{msg}: {volumes}"
         logger.info(msg)
     else:
@@ -831,6 +1060,14 @@ async def handle_toggle_audio(data: Payload) -> dict[str, Any]:  # pylint: disab
 # Security middleware
 # --------------------------------------------------------------------------- #
 
+LOCAL_IPS: Final[frozenset[str]] = frozenset({"127.0.0.1", "::1", "localhost"})
+EXPECTED_AUTH_HEADER: Final[bytes | None] = f"Bearer {REST_BEARER_TOKEN}".encode() if REST_BEARER_TOKEN else None
+
+# Fixed error responses (serialized once)
+AUTH_FAILED_BODY: Final[bytes] = json_dumps({"success": False, "error": "Invalid or missing REST_BEARER_TOKEN Authorization token"})
+PROTECTED_BLOCKED_BODY: Final[bytes] = json_dumps({"success": False, "error": "Protected REST commands require localhost or bearer token"})
+INVALID_JSON_BODY: Final[bytes] = json_dumps({"success": False, "error": "Invalid JSON payload"})
+
 @web.middleware  #type: ignore[misc]
 async def security_middleware(
         request: web.Request, handler: Callable[[web.Request], Awaitable[web.Response]]
@@ -849,22 +1086,17 @@ async def security_middleware(
     remote_ip = request.remote or request.headers.get("X-Forwarded-For", "unknown").split(",")[0].strip()
     logging.debug("[request] %s %s from %s", request.method, request.path, remote_ip)  # Log every request for debug
 
-    if REST_BEARER_TOKEN:
+    if EXPECTED_AUTH_HEADER is not None:
         auth_header = request.headers.get("Authorization", "")
-        if auth_header != f"Bearer {REST_BEARER_TOKEN}":
+        # Note: aiohttp decodes headers with surrogateescape, so re-encode the same way (else non-UTF-8 bytes raise)
+        if not hmac.compare_digest(auth_header.encode("utf-8", "surrogateescape"), EXPECTED_AUTH_HEADER):  # Constant-time compare
             logging.warning("[auth] Invalid REST_BEARER_TOKEN from %s", remote_ip)
-            return web.json_response(
-                {"success": False, "error": "Invalid or missing REST_BEARER_TOKEN Authorization token"},
-                status=401,)
-
-    cmd_name = getattr(handler, "cmd_name")
-    if cmd_name in PROTECTED_COMMANDS:
-        if  remote_ip not in ("127.0.0.1", "::1", "localhost") and REST_BEARER_TOKEN is None:
-            logging.warning("[security] Blocked protected REST command '%s' from non-localhost IP: %s", cmd_name, remote_ip)
-            return web.json_response({
-                "success": False,
-                "error": "Protected REST commands require localhost or bearer token"
-            }, status=403)
+            return json_body_response(AUTH_FAILED_BODY, status=401)
+
+    if getattr(handler, "is_protected", False):  # Note: /health and 404 handlers have no 'is_protected'
+        if  remote_ip not in LOCAL_IPS and REST_BEARER_TOKEN is None:
+            logging.warning("[security] Blocked protected REST command '%s' from non-localhost IP: %s", handler.cmd_name, remote_ip)
+            return json_body_response(PROTECTED_BLOCKED_BODY, status=403)
     return await handler(request)
 
 # --------------------------------------------------------------------------- #
@@ -874,31 +1106,32 @@ async def security_middleware(
 async def create_app() -> web.Application:
     """Create and configure the aiohttp Application instance."""
 
-    app = web.Application(middlewares=[security_middleware])
+    app = web.Application(middlewares=[security_middleware], client_max_size=MAX_REQUEST_SIZE)
 
     # Register routes for defined functions
     for fullname, func in FunctionRegistry.items():
         route = f"/{fullname}"
 
         async def make_handler(request: web.Request, function: Callable[..., Any] = func, name: str = fullname) -> web.Response:
-            try:
-                payload = await request.json() if request.can_read_body else {}
+            try:  # Note: only an empty body skips parsing, so malformed JSON or unknown keys are still rejected
+                payload = json_loads(await request.read()) if request.can_read_body else {}
             except (json.JSONDecodeError, ValueError):  # Malformed JSON from client
-                return web.json_response({"success": False, "error": "Invalid JSON payload"}, status=400)
+                return json_body_response(INVALID_JSON_BODY, status=400)
 
             try:
                 result = await function(payload)
                 logging.debug("Handler success for %s from %s", name, request.remote)  # Debug to avoid noise
-                return web.json_response(result)
+                return json_response(result)
             except (web.HTTPBadRequest, json.JSONDecodeError, ValueError) as e:
                 # Expected validation / input errors from registered functions
-                logging.debug("Handler error: validation error in %s: %s", name, str(e))  # Debug to avoid noise
-                return web.json_response({"success": False, "error": "Invalid JSON payload"}, status=400)
+                logging.debug("Handler error: validation error in %s: %s", name, e)  # Debug to avoid noise
+                return json_body_response(INVALID_JSON_BODY, status=400)
             except Exception as e:
-                logging.exception("Handler error for %s: %s", name, str(e))
-                return web.json_response({"success": False, "Internal server error": str(e)}, status=500)
+                logging.exception("Handler error for %s: %s", name, e)
+                return json_response({"success": False, "Internal server error": str(e)}, status=500)
 
         make_handler.cmd_name = fullname  # type: ignore[attr-defined]
+        make_handler.is_protected = fullname in PROTECTED_COMMANDS  # type: ignore[attr-defined]
 
         if fullname in HTTP_GET_COMMANDS:
             app.router.add_get(route, make_handler)
@@ -907,17 +1140,28 @@ async def create_app() -> web.Application:
 
     # === Special routes ===
     # Health check — always allowed, no auth, no protection
-    app.router.add_get("/health", lambda _: web.json_response({"status": "ok"}))
+    health_body = json_dumps({"status": "ok"})  # Serialize once
+    async def health(_request: web.Request) -> web.Response:
+        return json_body_response(health_body)
+    app.router.add_get("/health", health)
 
     # Catch-all 404 — clean and safe
     async def not_found(request: web.Request) -> web.Response:
         logging.warning("[404] %s %s from %s", request.method, request.path, request.remote or "unknown")
-        return web.json_response(
+        return json_response(
             {"success": False, "error": f"Endpoint not found: {request.path}"},
             status=404
         )
     app.router.add_route("*", "/{tail:.*}", not_found)
 
+    # Open the shared X connection once at startup (rather than on first request) and close it on shutdown
+    async def open_xlib(_app: web.Application) -> None:
+        await xlib_request(lambda d: None)
+    async def close_xlib(_app: web.Application) -> None:
+        close_xlib_display()
+    app.on_startup.append(open_xlib)
+    app.on_cleanup.append(close_xlib)
+
     return app
 
 # --------------------------------------------------------------------------- #
@@ -928,9 +1172,9 @@ async def main() -> None:
     app = await create_app()
     logging.info("Starting HAOS Kiosk REST server on http://%s:%s", REST_IP, REST_PORT)
 
-    runner = web.AppRunner(app)
+    runner = web.AppRunner(app, access_log=None)  # Handlers do their own logging
     await runner.setup()
-    site = web.TCPSite(runner, REST_IP, REST_PORT)
+    site = web.TCPSite(runner, REST_IP, REST_PORT, backlog=256)
 
     try:
         await site.start()
@@ -939,8 +1183,14 @@ async def main() -> None:
         logging.error("Failed to bind to %s:%s → %s", REST_IP, REST_PORT, exc)
         sys.exit(1)
 
-    await asyncio.Event().wait()  # run forever
+    try:
+        await asyncio.Event().wait()  # run forever
+    finally:
+        await runner.cleanup()  # Runs on_cleanup hooks
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())